@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+from app.metrics import metrics as default_metrics
+from app.profiling import current_profile, profile_thread
+
+
+class MicroBatcher:
+    """
+    Agrupa requisições concorrentes de recomendação em micro-lotes.
+
+    As requisições que chegam dentro de uma janela de tempo (`window_ms`), ou até
+    `max_batch_size` requisições, são pontuadas juntas por `score_batch`, e o future
+    de cada chamador é resolvido com o seu próprio top-k.
+
+    Args:
+        score_batch (callable): Função `score_batch(user_ids, top_n) -> list` que retorna
+            uma lista de recomendações para cada usuário, na mesma ordem.
+        window_ms (float): Tempo máximo de espera para completar um lote, em milissegundos.
+        max_batch_size (int): Tamanho máximo de um lote.
+        metrics: Registro de métricas onde tamanho de lote e tempo de fila são reportados.
+    """
+
+    def __init__(self, score_batch, window_ms: float = 5.0, max_batch_size: int = 64, metrics=None):
+        self.score_batch = score_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.metrics = metrics or default_metrics
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, user_id: int, top_n: int = 10) -> list:
+        """
+        Enfileira um usuário para pontuação e aguarda as suas recomendações.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((user_id, top_n, future, time.perf_counter(), current_profile()))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+
+            self.metrics.observe("batch_size", len(batch))
+            for _, _, _, enqueued_at, _ in batch:
+                self.metrics.observe("batch_queue_wait_ms", (started - enqueued_at) * 1000)
+
+            # Pontua fora do event loop para não bloquear novas requisições
+            results = await loop.run_in_executor(None, self._score, batch)
+            self.metrics.observe("batch_scoring_ms", (time.perf_counter() - started) * 1000)
+
+            for (_, _, future, _, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _score(self, batch: list) -> list:
+        # A thread do executor é amostrada pelos perfis de todas as requisições do lote
+        with profile_thread(*{id(profile): profile for *_, profile in batch}.values()):
+            return self._score_batch(batch)
+
+    def _score_batch(self, batch: list) -> list:
+        user_ids = [user_id for user_id, _, _, _, _ in batch]
+        top_n = max(top_n for _, top_n, _, _, _ in batch)
+        try:
+            results = self.score_batch(user_ids, top_n)
+            return [recs[:n] for recs, (_, n, _, _, _) in zip(results, batch)]
+        except Exception:
+            # Uma requisição inválida não deve derrubar o lote inteiro:
+            # pontua individualmente para isolar o erro no chamador correspondente.
+            results = []
+            for user_id, n, _, _, _ in batch:
+                try:
+                    results.append(self.score_batch([user_id], n)[0])
+                except Exception as e:
+                    results.append(e)
+            return results
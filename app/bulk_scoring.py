@@ -0,0 +1,121 @@
+"""
+Job offline que pré-calcula o top-k de todos os usuários para a versão mais recente do modelo.
+
+Uso:
+    python -m app.bulk_scoring --k 50 --workers 4
+"""
+import argparse
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.mlflow_utils import load_latest_model, get_latest_model_version
+from app.model_utils import ModelRepresentations, build_item_mapping, top_k_indices
+from app.topk_store import create_store
+
+# Representações do modelo em cada processo do pool (definidas pelo initializer)
+_worker_representations = None
+_worker_n_items = None
+
+
+def _init_worker(representations, n_items):
+    global _worker_representations, _worker_n_items
+    _worker_representations = representations
+    _worker_n_items = n_items
+
+
+def _score_chunk(user_ids, k):
+    scores = _worker_representations.score(user_ids, np.arange(_worker_n_items))
+    return top_k_indices(scores, k)
+
+
+def load_user_mapping(user_data_path: str, mapping_path: str = None) -> dict:
+    """
+    Retorna o mapeamento userId -> linha do usuário no modelo.
+
+    Com `mapping_path`, usa o mapeamento salvo do treino (`Dataset.mapping()[0]`). Sem ele,
+    reproduz o mapeamento da API: a ordem de aparição do usuário na partição servida.
+    """
+    if mapping_path:
+        with open(mapping_path, "rb") as f:
+            user_id_mapping = pickle.load(f)
+        if not isinstance(user_id_mapping, dict):
+            raise TypeError(f"{mapping_path} deve conter um dict userId -> índice (Dataset.mapping()[0]).")
+        return user_id_mapping
+
+    with open(user_data_path, "rb") as f:
+        user_data = pickle.load(f)
+    print(f"Debug: {user_data_path} carregado ({len(user_data)} linhas).")
+    return {user_id: i for i, user_id in enumerate(user_data['userId'].unique())}
+
+
+def run(model_name: str, user_data_path: str, news_path: str, output: str, k: int, chunk_size: int, workers: int,
+        user_mapping_path: str = None) -> dict:
+    version = get_latest_model_version(model_name)
+    response = load_latest_model(model_name)
+    if response["status"] != "success":
+        return response
+    if get_latest_model_version(model_name) != version:
+        return {"status": "error", "message": "Uma nova versão do modelo foi registrada durante o carregamento."}
+
+    with open(news_path, "rb") as f:
+        news_data = pickle.load(f)
+    _, reverse_item_id_mapping = build_item_mapping(news_data)
+
+    representations = ModelRepresentations.from_model(response["model"])
+    n_items = min(len(reverse_item_id_mapping), representations.n_items)
+    n_users = representations.user_embeddings.shape[0]
+
+    # Usuários sem linha no modelo ficam fora do store e seguem para a pontuação ao vivo
+    user_id_mapping = load_user_mapping(user_data_path, user_mapping_path)
+    users = [(user_id, integer_user_id) for user_id, integer_user_id in user_id_mapping.items()
+             if 0 <= integer_user_id < n_users]
+    items = [reverse_item_id_mapping[i] for i in range(n_items)]
+
+    # Escreve num diretório temporário e publica ao final, para a API nunca ler um store incompleto
+    tmp_version = f"{version}.tmp"
+    codes = create_store(output, tmp_version, [user_id for user_id, _ in users], items, k)
+    integer_ids = np.array([integer_user_id for _, integer_user_id in users], dtype=np.int32)
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(representations, n_items)) as pool:
+        starts = range(0, len(integer_ids), chunk_size)
+        chunks = (integer_ids[start:start + chunk_size] for start in starts)
+        for start, top in zip(starts, pool.map(_score_chunk, chunks, [k] * len(starts))):
+            codes[start:start + len(top), :top.shape[1]] = top
+    codes.flush()
+    del codes
+
+    final_path = os.path.join(output, str(version))
+    if os.path.exists(final_path):
+        shutil.rmtree(final_path)
+    os.replace(os.path.join(output, tmp_version), final_path)
+
+    return {
+        "status": "success",
+        "message": f"Top-{k} pré-calculado para {len(users)} usuários "
+                   f"({len(user_id_mapping) - len(users)} ignorados sem linha no modelo).",
+        "version": version,
+        "path": final_path,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-calcula o top-k de todos os usuários num store memory-mapped.")
+    parser.add_argument("--model-name", default="recommendation_model")
+    parser.add_argument("--user-data", default="data/user_part_0.pkl", help="Partição de usuários servida pela API (a do treino)")
+    parser.add_argument("--user-mapping", default=None, help="Pickle com Dataset.mapping()[0] do treino (tem precedência sobre --user-data)")
+    parser.add_argument("--news-path", default="data/news_label_0.pkl")
+    parser.add_argument("--output", default=os.getenv("TOPK_STORE_DIR", "data/topk_store"))
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(run(args.model_name, args.user_data, args.news_path, args.output, args.k, args.chunk_size, args.workers,
+              args.user_mapping))
@@ -0,0 +1,60 @@
+import json
+import os
+import queue
+import random
+import threading
+
+from app.metrics import metrics as default_metrics
+
+
+class TrafficCapture:
+    """
+    Captura amostrada de requisições e respostas em JSONL.
+
+    O registro só enfileira a entrada (sem bloquear a requisição); uma thread auxiliar
+    faz a escrita em disco. Se a fila estiver cheia, a entrada é descartada e contada
+    (métrica `capture_dropped`).
+
+    Args:
+        path (str): Arquivo JSONL de saída (as entradas são acrescentadas ao final).
+        sample_rate (float): Fração das requisições capturadas.
+        max_queue (int): Tamanho máximo da fila de escrita.
+        metrics: Registro de métricas onde as entradas descartadas são reportadas.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 1.0, max_queue: int = 10000, metrics=None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.metrics = metrics or default_metrics
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def sample(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, entry: dict):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            self.metrics.increment("capture_dropped")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                f.write(json.dumps(entry, default=str) + "\n")
+                # Escreve em lote o que já estiver na fila antes de descarregar o buffer
+                if self._queue.empty():
+                    f.flush()
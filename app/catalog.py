@@ -0,0 +1,247 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.model_utils import build_item_mapping, get_representations, unwrap_lightfm
+
+# Colunas de exibição das notícias (sem os tokens dos textos)
+NEWS_METADATA_COLUMNS = ["page", "title", "caption", "body", "count"]
+
+
+class _Block:
+    """
+    Bloco imutável de notícias ingeridas numa mesma chamada.
+
+    As features de cada notícia ficam guardadas (índices e pesos normalizados), e as
+    representações latentes são calculadas a partir dos embeddings de features do
+    modelo, em cache por modelo (recalculadas após um /update_model).
+    """
+
+    def __init__(self, start: int, records: list, feature_ids: list, feature_weights: list):
+        self.start = start
+        self.records = records
+        self.pages = [record["page"] for record in records]
+        self.feature_ids = feature_ids
+        self.feature_weights = feature_weights
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def representations(self, model):
+        cached = self._cache.get(id(model))
+        if cached is not None and cached[0] is model:
+            return cached[1], cached[2]
+
+        lightfm_model, item_features, _ = unwrap_lightfm(model)
+        if item_features is None:
+            # Sem matriz de features, as linhas das representações (talvez quantizadas) são as do modelo
+            representations = get_representations(model)
+            feature_biases, feature_vectors = representations.item_biases, representations.item_vectors
+        else:
+            feature_biases, feature_vectors = lightfm_model.item_biases, lambda ids: lightfm_model.item_embeddings[ids]
+
+        n_components = feature_vectors([0]).shape[1]
+        biases = np.zeros(len(self), dtype=np.float32)
+        embeddings = np.zeros((len(self), n_components), dtype=np.float32)
+        for row, (ids, weights) in enumerate(zip(self.feature_ids, self.feature_weights)):
+            if len(ids):
+                biases[row] = weights @ feature_biases[ids]
+                embeddings[row] = weights @ feature_vectors(ids)
+
+        self._cache = {id(model): (model, biases, embeddings)}
+        return biases, embeddings
+
+
+class CatalogVersion:
+    """
+    Visão de uma versão do catálogo de notícias.
+
+    O DataFrame original e os blocos ingeridos são compartilhados (sem cópia) entre
+    versões; cada versão enxerga apenas os blocos existentes no momento em que foi criada.
+    """
+
+    def __init__(self, number: int, news_data: pd.DataFrame, base_rows: dict, page_index: dict, blocks: tuple,
+                 count_increments: dict = None):
+        self.number = number
+        self.news_data = news_data
+        self.base_rows = base_rows
+        self.page_index = page_index
+        self.blocks = blocks
+        self.count_increments = count_increments or {}
+        self.item_id_mapping, self.reverse_item_id_mapping = build_item_mapping(news_data)
+        self.n_base = len(self.item_id_mapping)
+        self.n_items = self.n_base + sum(len(block) for block in blocks)
+
+    @property
+    def n_extra(self) -> int:
+        return self.n_items - self.n_base
+
+    def item_index(self, page):
+        """Índice do item no catálogo desta versão, ou None."""
+        index = self.item_id_mapping.get(page)
+        if index is None:
+            index = self.page_index.get(page)
+            if index is not None and index >= self.n_items:
+                return None
+        return index
+
+    def page_at(self, index: int):
+        if index < self.n_base:
+            return self.reverse_item_id_mapping[index]
+        for block in self.blocks:
+            if index < block.start + len(block):
+                return block.pages[index - block.start]
+        raise IndexError(index)
+
+    def score_extra(self, representations, model, user_ids) -> np.ndarray:
+        """
+        Pontua as notícias ingeridas (n_usuários x n_extra) com as representações do modelo.
+        """
+        user_ids = np.asarray(user_ids)
+        if not self.blocks:
+            return np.empty((len(user_ids), 0), dtype=np.float32)
+
+        user_embeddings = representations.user_vectors(user_ids)
+        user_biases = representations.user_biases[user_ids][:, None]
+        scores = []
+        for block in self.blocks:
+            item_biases, item_embeddings = block.representations(model)
+            scores.append(user_embeddings @ item_embeddings.T + user_biases + item_biases[None, :])
+        return np.hstack(scores)
+
+    def popular(self, top_n: int = 10) -> list:
+        """Notícias mais populares (coluna `count` + visualizações registradas), incluindo as ingeridas."""
+        base = self.news_data.nlargest(top_n, 'count')[['page', 'count']]
+        counts = dict(zip(base['page'], base['count'].fillna(0)))
+        for block in self.blocks:
+            counts.update((record["page"], record.get("count", 0)) for record in block.records)
+        # Os incrementos só aumentam contagens: basta somá-los às páginas já ranqueadas e às incrementadas
+        for page, increment in self.count_increments.items():
+            if page not in counts and page in self.base_rows:
+                count = self.news_data['count'].iat[self.base_rows[page]]
+                counts[page] = 0 if pd.isna(count) else count
+            counts[page] = counts.get(page, 0) + increment
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [page for page, _ in ranked[:top_n]]
+
+    def metadata(self, pages: list) -> list:
+        """Metadados de exibição das notícias informadas (com as visualizações registradas em `count`)."""
+        columns = [column for column in NEWS_METADATA_COLUMNS if column in self.news_data.columns]
+        pages = list(dict.fromkeys(pages))
+        positions = [self.base_rows[page] for page in pages if page in self.base_rows]
+        records = self.news_data.iloc[positions][columns].to_dict(orient='records')
+
+        for page in pages:
+            index = self.item_index(page)
+            if page not in self.base_rows and index is not None:
+                record = self._record_at(index)
+                records.append({column: record.get(column) for column in NEWS_METADATA_COLUMNS})
+
+        for record in records:
+            increment = self.count_increments.get(record.get("page"))
+            if increment:
+                count = record.get("count")
+                record["count"] = (0 if count is None or pd.isna(count) else count) + increment
+        return records
+
+    def _record_at(self, index: int) -> dict:
+        for block in self.blocks:
+            if index < block.start + len(block):
+                return block.records[index - block.start]
+        raise IndexError(index)
+
+
+class NewsCatalog:
+    """
+    Catálogo de notícias append-only, com ingestão incremental sem reiniciar a API.
+
+    As escritas são serializadas; a leitura usa sempre `catalog.current`, trocada
+    atomicamente (atribuição de referência) a cada ingestão.
+    """
+
+    def __init__(self, news_data: pd.DataFrame):
+        base_rows = {}
+        for position, page in enumerate(news_data['page']):
+            base_rows.setdefault(page, position)
+
+        self._lock = threading.Lock()
+        self._page_index = {}
+        self.current = CatalogVersion(0, news_data, base_rows, self._page_index, ())
+
+    def ingest(self, articles: list, model, feature_mapping: dict = None) -> dict:
+        """
+        Acrescenta novas notícias ao catálogo e publica uma nova versão.
+
+        Args:
+            articles (list): Notícias (dicts com page, title, caption, body, count e features).
+            model: Modelo usado para obter o tamanho dos embeddings de features.
+            feature_mapping (dict): Mapeamento nome da feature -> índice (do `Dataset` do LightFM).
+
+        Returns:
+            dict: Versão publicada, notícias adicionadas e ignoradas (já existentes).
+        """
+        feature_mapping = feature_mapping or {}
+        with self._lock:
+            version = self.current
+            added, skipped = [], []
+            added_pages = set()
+            records, feature_ids, feature_weights = [], [], []
+            for article in articles:
+                page = article["page"]
+                if version.item_index(page) is not None or page in added_pages:
+                    skipped.append(page)
+                    continue
+
+                ids = np.array([feature_mapping[f] for f in article.get("features", []) if f in feature_mapping], dtype=np.int32)
+                # Mesma normalização do Dataset.build_item_features: pesos somam 1
+                weights = np.full(len(ids), 1 / len(ids), dtype=np.float32) if len(ids) else np.empty(0, dtype=np.float32)
+
+                records.append({column: article.get(column) for column in NEWS_METADATA_COLUMNS} | {"count": article.get("count") or 0})
+                feature_ids.append(ids)
+                feature_weights.append(weights)
+                added.append(page)
+                added_pages.add(page)
+
+            if not records:
+                return {"status": "success", "version": version.number, "added": added, "skipped": skipped}
+
+            block = _Block(version.n_items, records, feature_ids, feature_weights)
+            if model is not None:
+                block.representations(model)
+
+            for offset, page in enumerate(block.pages):
+                self._page_index[page] = block.start + offset
+
+            self.current = CatalogVersion(version.number + 1, version.news_data, version.base_rows,
+                                          self._page_index, version.blocks + (block,), version.count_increments)
+            return {"status": "success", "version": self.current.number, "added": added, "skipped": skipped}
+
+    def record_views(self, views: dict) -> dict:
+        """
+        Soma visualizações às contagens de popularidade e publica uma nova versão.
+
+        Args:
+            views (dict): Mapeamento page -> número de novas visualizações (positivo).
+
+        Returns:
+            dict: Versão publicada, notícias atualizadas e desconhecidas (fora do catálogo).
+        """
+        with self._lock:
+            version = self.current
+            increments = dict(version.count_increments)
+            updated, unknown = [], []
+            for page, count in views.items():
+                if version.item_index(page) is None:
+                    unknown.append(page)
+                    continue
+                increments[page] = increments.get(page, 0) + count
+                updated.append(page)
+
+            if not updated:
+                return {"status": "success", "version": version.number, "updated": updated, "unknown": unknown}
+
+            self.current = CatalogVersion(version.number + 1, version.news_data, version.base_rows,
+                                          self._page_index, version.blocks, increments)
+            return {"status": "success", "version": self.current.number, "updated": updated, "unknown": unknown}
@@ -1,7 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Body, Request, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, FileResponse
 from mlflow.exceptions import MlflowException
+from pydantic import BaseModel
 import os
 import sys
+import time
+import random
+import asyncio
 import pickle
 import mlflow
 import uvicorn
@@ -11,13 +17,27 @@ from app.mlflow_utils import (
     get_experiment_metrics,
     list_models,
     update_model,
-    load_latest_model
+    load_latest_model,
+    get_latest_model_version
 )
 from app.model_utils import (
     predict_recommendations, 
+    predict_recommendations_batch,
     cold_start_recommendations, 
-    get_user_history
+    history_recommendations,
+    get_user_history,
+    build_item_mapping,
+    quantization_report
 )
+from app.batching import MicroBatcher
+from app.catalog import NewsCatalog
+from app.retrieval import build_pipeline
+from app.metrics import metrics
+from app.topk_store import TopKStore
+from app import profiling
+from app.profiling import ProfileStore, profile_section, start_profile
+from app.serving import ResultCache, DeadlineRunner, DeadlineExceeded, wait_with_deadline
+from app.capture import TrafficCapture
 from app.utils import LightFMWrapper
 
 app = FastAPI(title="News Recommendation API", version="1.0")
@@ -28,6 +48,42 @@ mlflow.set_experiment("news_recommendation")
 sys.path.append("app/utils")
 model_path = "mlruns/models/lightfm_model.pkl"
 
+# Micro-batching opcional das requisições de /predict
+BATCHING_ENABLED = os.getenv("PREDICT_BATCHING", "0") == "1"
+BATCH_WINDOW_MS = float(os.getenv("PREDICT_BATCH_WINDOW_MS", "5"))
+BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+
+# Número padrão de candidatos do pipeline de dois estágios (0 = pontua o catálogo inteiro)
+RETRIEVAL_N_CANDIDATES = int(os.getenv("RETRIEVAL_N_CANDIDATES", "0"))
+# Maior `k` aceito pelo /predict
+PREDICT_MAX_K = int(os.getenv("PREDICT_MAX_K", "100"))
+
+# Mapeamento nome da feature -> índice (Dataset.mapping() do treino), usado na ingestão de notícias
+ITEM_FEATURE_MAPPING_PATH = os.getenv("ITEM_FEATURE_MAPPING_PATH", "data/item_feature_mapping.pkl")
+
+# Recomendações pré-calculadas pelo job app/bulk_scoring.py
+TOPK_STORE_DIR = os.getenv("TOPK_STORE_DIR", "data/topk_store")
+# Versão do registro a que corresponde o modelo local; sem ela, o store só é aberto após o /update_model
+LOCAL_MODEL_VERSION = os.getenv("LOCAL_MODEL_VERSION")
+
+# Profiling sob demanda (header "X-Profile: 1" ou amostragem aleatória das requisições)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+# Prazo por requisição do /predict (também configurável pelo header X-Deadline-Ms)
+PREDICT_DEADLINE_MS = float(os.getenv("PREDICT_DEADLINE_MS", "500"))
+# Máximo de pontuações ao vivo simultâneas; acima disso a requisição vai direto para o fallback
+PREDICT_MAX_INFLIGHT = int(os.getenv("PREDICT_MAX_INFLIGHT", "8"))
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "10000"))
+
+# Captura amostrada do tráfego do /predict, para replay com app/replay.py
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "0") == "1"
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.1"))
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "captures/predict.jsonl")
+
 # Carregar o modelo com pickle no startup
 def load_local_model():
     try:
@@ -63,9 +119,62 @@ try:
     with open(r"data\news_label_0.pkl", "rb") as f:
         news_data =  pickle.load(f)
         print("Debug: Dados de notícias carregados com sucesso!")
+
+        # Catálogo append-only; as leituras usam sempre news_catalog.current
+        news_catalog = NewsCatalog(news_data)
 except FileNotFoundError:
     print("Error: news_label_0.pkl not found")
     news_data = None
+    news_catalog = None
+
+try:
+    with open(ITEM_FEATURE_MAPPING_PATH, "rb") as f:
+        item_feature_mapping = pickle.load(f)
+    # Deve ser o mapeamento de features de itens do treino: Dataset.mapping()[3]
+    if not isinstance(item_feature_mapping, dict):
+        raise TypeError(
+            f"{ITEM_FEATURE_MAPPING_PATH} deve conter um dict nome da feature -> índice "
+            f"(Dataset.mapping()[3]), mas contém {type(item_feature_mapping).__name__}."
+        )
+except FileNotFoundError:
+    print(f"Aviso: {ITEM_FEATURE_MAPPING_PATH} não encontrado; notícias ingeridas não terão embeddings de features.")
+    item_feature_mapping = None
+
+# Versão dos dados servidos; muda quando o modelo é atualizado, invalidando caches dos clientes
+data_version = str(time.time_ns())
+
+# Pipeline de geração de candidatos + re-ranqueamento
+if news_data is not None:
+    item_id_mapping, _ = build_item_mapping(news_data)
+    retrieval_pipeline = build_pipeline(news_data, user_data, item_id_mapping)
+    # Constrói o índice de embeddings antes da primeira requisição
+    if model is not None:
+        try:
+            retrieval_pipeline.prepare(model)
+        except Exception as e:
+            print(f"Aviso: não foi possível preparar o pipeline de candidatos: {e}")
+else:
+    retrieval_pipeline = None
+
+def load_topk_store(version):
+    """
+    Abre o store de top-k pré-calculado da versão do modelo em uso (None se a versão for desconhecida).
+    """
+    if version is None:
+        print("Aviso: versão do modelo desconhecida; store de top-k desativado até o /update_model.")
+        return None
+    try:
+        store = TopKStore.open(TOPK_STORE_DIR, version)
+    except Exception as e:
+        print(f"Aviso: não foi possível abrir o store de top-k: {e}")
+        return None
+    if store is not None:
+        print(f"Debug: Store de top-k da versão {version} carregado ({len(store.user_rows)} usuários).")
+    return store
+
+# Versão do registro do modelo em uso: o store de top-k só é usado se for dessa mesma versão
+model_version = LOCAL_MODEL_VERSION if model is not None else None
+topk_store = load_topk_store(model_version)
 
 lightfm_model = LightFMWrapper(model)
 
@@ -119,17 +228,94 @@ app.add_middleware(
     allow_headers=["*"],  # Permite qualquer cabeçalho
 )
 
+# O middleware só é registrado com o profiling ativo: desligado, não há custo por requisição
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES) if PROFILING_ENABLED else None
+
+if PROFILING_ENABLED:
+    profiling.ENABLED = True
+
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        requested = request.headers.get("x-profile") == "1"
+        if request.url.path.startswith("/admin/") or not (requested or random.random() < PROFILE_SAMPLE_RATE):
+            return await call_next(request)
+
+        profile = start_profile(request.method, request.url.path, PROFILE_INTERVAL_MS)
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            profile.profiler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            profile.add_section("request", duration_ms)
+            # Grava fora do caminho da resposta
+            asyncio.get_running_loop().run_in_executor(None, profile_store.save, profile.to_dict(duration_ms, status_code))
+
 """SEÇÃO DE RECOMENDAÇÕES"""
 
+def score_batch(user_ids: list, top_n: int) -> list:
+    # Usa sempre o modelo global atual, para respeitar o /update_model
+    return predict_recommendations_batch(model, user_ids, news_data, top_n=top_n, catalog=news_catalog.current)
+
+batcher = MicroBatcher(score_batch, window_ms=BATCH_WINDOW_MS, max_batch_size=BATCH_MAX_SIZE) if BATCHING_ENABLED else None
+deadline_runner = DeadlineRunner(PREDICT_MAX_INFLIGHT)
+recent_results = ResultCache(PREDICT_CACHE_SIZE)
+traffic_capture = TrafficCapture(CAPTURE_PATH, CAPTURE_SAMPLE_RATE) if CAPTURE_ENABLED else None
+
+@app.on_event("shutdown")
+async def shutdown():
+    if batcher is not None:
+        await batcher.stop()
+    if traffic_capture is not None:
+        traffic_capture.close()
+
+def serialize_response(payload: dict) -> JSONResponse:
+    # Serializa explicitamente para que o tempo de serialização apareça nos perfis
+    with profile_section("serialization"):
+        return JSONResponse(content=jsonable_encoder(payload))
+
 @app.get("/")
 async def root():
     return app.openapi()
 
+async def score_with_deadline(integer_user_id: int, history: list, k: int, n_candidates: int, deadline: float) -> list:
+    """
+    Pontua o usuário com o modelo completo, respeitando o prazo da requisição.
+    """
+    if n_candidates > 0 and retrieval_pipeline is not None:
+        recommendations = await deadline_runner.run(deadline, predict_recommendations, model, integer_user_id, history, news_data,
+                                                    top_n=k, pipeline=retrieval_pipeline, n_candidates=n_candidates)
+    elif batcher is not None:
+        recommendations = await wait_with_deadline(deadline, batcher.submit(integer_user_id, top_n=k))
+    else:
+        recommendations = await deadline_runner.run(deadline, predict_recommendations, model, integer_user_id, history, news_data,
+                                                    top_n=k, catalog=news_catalog.current)
+
+    # predict_recommendations devolve um dicionário de erro em vez de levantar exceção
+    if isinstance(recommendations, dict):
+        raise RuntimeError(recommendations.get("message", "Erro na predição"))
+    return recommendations
+
 @app.post("/predict/{user_id}")
-async def predict(user_id: str):  # Certifique-se de que user_id é um número
+async def predict(user_id: str, k: int = Query(10, ge=1, le=PREDICT_MAX_K),
+                  n_candidates: int = Query(RETRIEVAL_N_CANDIDATES, ge=0),
+                  x_deadline_ms: float | None = Header(default=None)):  # Certifique-se de que user_id é um número
     """
     Gera recomendações para um usuário com base no histórico de leitura.
+
+    `k` define o número de recomendações e `n_candidates` o número de candidatos
+    re-ranqueados pelo modelo (0 pontua o catálogo inteiro).
+
+    Se o modelo não responder dentro do prazo (header `X-Deadline-Ms` ou `PREDICT_DEADLINE_MS`)
+    ou falhar, a resposta degrada, nesta ordem, para: resultado em cache ou pré-calculado,
+    notícias mais lidas pelo usuário e notícias populares. O campo `tier` indica a origem.
     """
+    started = time.perf_counter()
+    deadline = started + (x_deadline_ms or PREDICT_DEADLINE_MS) / 1000
+    request_params = {"k": k, "n_candidates": n_candidates, "deadline_ms": x_deadline_ms}
     try:
         print(f"🔍 Requisição recebida para user_id={user_id}")
 
@@ -142,25 +328,79 @@ async def predict(user_id: str):  # Certifique-se de que user_id é um número
         if user_id_mapping is None:
             raise HTTPException(status_code=500, detail="User ID mapping not loaded.")
 
-        history_data = get_user_history(user_id, user_data, user_id_mapping)
+        # Recomendações pré-calculadas para a versão atual do modelo; se ausentes, pontua ao vivo
+        if topk_store is not None and k <= topk_store.k:
+            with profile_section("topk_store"):
+                recommendations = topk_store.get(user_id, k)
+            if recommendations:
+                metrics.increment("topk_store_hits")
+                return predict_response(user_id, recommendations, "precomputed", started, request_params)
+            metrics.increment("topk_store_misses")
+
+        with profile_section("get_user_history"):
+            history_data = get_user_history(user_id, user_data, user_id_mapping)
 
         if history_data is None:
             print("⚠️ Nenhum histórico encontrado, usando cold start.")
-            recommendations = cold_start_recommendations(news_data)
-            return {"user_id": user_id, "recommendations": recommendations}
+            with profile_section("cold_start_recommendations"):
+                recommendations = cold_start_recommendations(news_data, top_n=k, catalog=news_catalog.current)
+            return predict_response(user_id, recommendations, "popularity", started, request_params)
 
         history, integer_user_id = history_data
 
-        if model is None:
-             raise HTTPException(status_code=500, detail="Model not loaded.")
-
-        recommendations = predict_recommendations(model, integer_user_id, history, news_data)
-        return {"user_id": user_id, "recommendations": recommendations}
-
+        # 1. Modelo completo, dentro do prazo
+        if model is not None:
+            try:
+                with profile_section("predict_recommendations"):
+                    recommendations = await score_with_deadline(integer_user_id, history, k, n_candidates, deadline)
+                recent_results.put((user_id, k), recommendations)
+                return predict_response(user_id, recommendations, "model", started, request_params)
+            except DeadlineExceeded as e:
+                print(f"⚠️ {e} Usando fallback para user_id={user_id}.")
+                metrics.increment("predict_deadline_exceeded")
+            except Exception as e:
+                print(f"❌ Erro na predição, usando fallback: {e}")
+                metrics.increment("predict_model_errors")
+
+        # 2. Resultado recente em cache ou pré-calculado (mesmo com menos de k itens)
+        recommendations = recent_results.get((user_id, k))
+        if not recommendations and topk_store is not None:
+            recommendations = topk_store.get(user_id, k)
+        if recommendations:
+            return predict_response(user_id, recommendations, "cached", started, request_params)
+
+        # 3. Notícias mais lidas pelo próprio usuário
+        recommendations = history_recommendations(history, top_n=k)
+        if recommendations:
+            return predict_response(user_id, recommendations, "history", started, request_params)
+
+        # 4. Notícias populares
+        with profile_section("cold_start_recommendations"):
+            recommendations = cold_start_recommendations(news_data, top_n=k, catalog=news_catalog.current)
+        return predict_response(user_id, recommendations, "popularity", started, request_params)
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erro na API /predict: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def predict_response(user_id: str, recommendations: list, tier: str, started: float, request_params: dict) -> JSONResponse:
+    latency_ms = (time.perf_counter() - started) * 1000
+    metrics.increment(f"predict_tier_{tier}")
+    metrics.observe("predict_latency_ms", latency_ms)
+
+    payload = {"user_id": user_id, "recommendations": recommendations, "tier": tier}
+    if traffic_capture is not None and traffic_capture.sample():
+        traffic_capture.record({
+            "timestamp": time.time() - latency_ms / 1000,
+            "user_id": user_id,
+            **request_params,
+            "response": payload,
+            "latency_ms": latency_ms,
+        })
+    return serialize_response(payload)
+
 
 @app.get("/cold_start")
 async def cold_start():
@@ -169,9 +409,54 @@ async def cold_start():
     """
     if news_data is None:
         raise HTTPException(status_code=500, detail="News data not loaded.")
-    recommendations = cold_start_recommendations(news_data)
+    recommendations = cold_start_recommendations(news_data, catalog=news_catalog.current)
     return {"recommendations": recommendations}
 
+@app.get("/quantization_report")
+def get_quantization_report(k: int = 10, recall_k: int = 50, n_users: int = 1000):
+    """
+    Compara os embeddings float16 e int8 com os float32: overlap e recall do top-k,
+    memória e latência de pontuação.
+
+    Definido sem `async`: o FastAPI executa o cálculo num threadpool, fora do event loop.
+    """
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model not loaded.")
+    if news_data is None or user_id_mapping is None:
+        raise HTTPException(status_code=500, detail="User or news data not loaded.")
+    try:
+        return quantization_report(model, news_data, len(user_id_mapping), k=k, recall_k=recall_k, n_users=n_users)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Retorna as métricas de serviço coletadas em memória (ex.: tamanho de lote e tempo de fila).
+    """
+    return metrics.snapshot()
+
+"""SEÇÃO DE PROFILING"""
+
+@app.get("/admin/profiles")
+async def list_profiles():
+    """
+    Lista os perfis de requisições salvos, do mais recente ao mais antigo.
+    """
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Profiling disabled.")
+    return {"profiles": profile_store.list()}
+
+@app.get("/admin/profiles/{name}")
+async def download_profile(name: str):
+    """
+    Baixa um perfil salvo (JSON com tempos por seção e pilhas amostradas no formato collapsed).
+    """
+    path = profile_store.path(name) if profile_store is not None else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, media_type="application/json", filename=name)
+
 """SEÇÃO DO MLFLOW"""
 
 @app.post("/log_model")
@@ -190,10 +475,24 @@ async def update():
     """
     Atualiza o modelo usado pela API para a última versão registrada no MLflow.
     """
-    global model
-    update_response = update_model("models:/recommendation_model/latest")
+    global model, model_version, data_version, topk_store
+    # Carrega a versão pelo número, para o store aberto ser exatamente o do modelo carregado
+    try:
+        version = get_latest_model_version("recommendation_model")
+    except Exception as e:
+        return {"status": "error", "message": f"Erro ao consultar a versão do modelo: {e}", "model": None}
+    if version is None:
+        return {"status": "error", "message": "Nenhuma versão registrada do modelo.", "model": None}
+    update_response = update_model(f"models:/recommendation_model/{version}")
     if update_response["status"] == "success":
-        model = update_response["model"]
+        # Prepara o novo modelo antes da troca, para as requisições não pagarem a construção do índice
+        if retrieval_pipeline is not None:
+            await asyncio.get_running_loop().run_in_executor(None, retrieval_pipeline.prepare, update_response["model"])
+        model, model_version = update_response["model"], version
+        # Resultados do modelo anterior não podem servir de fallback para a nova versão
+        recent_results.clear()
+        data_version = str(time.time_ns())
+        topk_store = load_topk_store(version)
     return update_response
 
 @app.get("/get_model_info")
@@ -237,5 +536,72 @@ async def get_news_data():
         raise HTTPException(status_code=500, detail="News data not loaded.")
     return news_data.to_dict(orient='records') #Converte dataframe para dicionário
 
+@app.post("/news_metadata")
+async def news_metadata(pages: list[str] = Body(...)):
+    """
+    Retorna apenas os metadados de exibição das notícias solicitadas.
+    """
+    if news_data is None:
+        raise HTTPException(status_code=500, detail="News data not loaded.")
+    return news_catalog.current.metadata(pages)
+
+class NewsArticle(BaseModel):
+    page: str
+    title: str = ""
+    caption: str = ""
+    body: str = ""
+    count: int = 0
+    features: list[str] = []
+
+@app.post("/ingest_news")
+async def ingest_news(articles: list[NewsArticle]):
+    """
+    Acrescenta novas notícias ao catálogo sem reiniciar a API. As notícias passam a ser
+    recomendadas imediatamente, com embeddings obtidos das suas features.
+    """
+    global data_version
+    if news_catalog is None:
+        raise HTTPException(status_code=500, detail="News data not loaded.")
+    try:
+        response = news_catalog.ingest([article.model_dump() for article in articles], model, item_feature_mapping)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if response["added"]:
+        data_version = str(time.time_ns())
+    return response
+
+@app.post("/news_views")
+async def news_views(views: dict[str, int]):
+    """
+    Registra novas visualizações de notícias (page -> quantidade), atualizando a
+    popularidade usada no cold-start e no fallback por popularidade.
+    """
+    global data_version
+    if news_catalog is None:
+        raise HTTPException(status_code=500, detail="News data not loaded.")
+    invalid = [page for page, count in views.items() if count <= 0]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"As visualizações devem ser positivas: {invalid}")
+    response = news_catalog.record_views(views)
+    if response["updated"]:
+        data_version = str(time.time_ns())
+    return response
+
+@app.get("/sample_users")
+async def sample_users(n: int = 10):
+    """
+    Retorna uma amostra aleatória de IDs de usuários.
+    """
+    if user_data is None:
+        raise HTTPException(status_code=500, detail="User data not loaded.")
+    return user_data['userId'].sample(n=min(n, len(user_data))).tolist()
+
+@app.get("/data_version")
+async def get_data_version():
+    """
+    Retorna a versão atual dos dados servidos, usada pelos clientes para invalidar caches.
+    """
+    return {"version": data_version}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8080, reload=True)
\ No newline at end of file
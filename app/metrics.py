@@ -0,0 +1,50 @@
+import threading
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+class Metrics:
+    """
+    Registro simples de métricas em memória (contadores e distribuições), seguro entre threads.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self._samples[name].append(value)
+
+    def snapshot(self) -> dict:
+        """
+        Retorna os contadores e um resumo (count, mean, p50, p95, p99, max) de cada distribuição.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {name: np.asarray(values, dtype=float) for name, values in self._samples.items()}
+
+        summaries = {}
+        for name, values in samples.items():
+            if values.size == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summaries[name] = {
+                "count": int(values.size),
+                "mean": float(values.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "max": float(values.max()),
+            }
+        return {"counters": counters, "summaries": summaries}
+
+
+# Instância global compartilhada pela API
+metrics = Metrics()
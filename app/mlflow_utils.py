@@ -33,6 +33,48 @@ def load_latest_model(model_name = "recommendation_model") -> dict:
             "model": None
         }
 
+def load_model_version(model_name = "recommendation_model", version = "latest") -> dict:
+    """
+    Carrega uma versão específica de um modelo registrado no MLflow Model Registry.
+
+    Args:
+        model_name (str): Nome do modelo registrado no MLflow.
+        version (str): Número da versão (ou "latest").
+
+    Returns:
+        dict: Dicionário com status, mensagem e o modelo carregado (se sucesso).
+    """
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+    try:
+        model = mlflow.pyfunc.load_model(f"models:/{model_name}/{version}")
+        return {
+            "status": "success",
+            "message": f"Modelo '{model_name}' versão {version} carregado com sucesso!",
+            "model": model
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Erro ao carregar modelo '{model_name}' versão {version}: {e}",
+            "model": None
+        }
+
+def get_latest_model_version(model_name = "recommendation_model"):
+    """
+    Retorna o número da versão mais recente do modelo no MLflow Model Registry.
+
+    Args:
+        model_name (str): Nome do modelo registrado no MLflow.
+
+    Returns:
+        str | None: Número da versão, ou None se não houver versões.
+    """
+    client = mlflow.tracking.MlflowClient()
+    model_versions = client.search_model_versions(f"name='{model_name}'")
+    if not model_versions:
+        return None
+    return str(max(int(mv.version) for mv in model_versions))
+
 @mlflow_logger("news_recommendation")
 def log_model_to_mlflow(model_path: str) -> dict:
     """
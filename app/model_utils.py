@@ -1,17 +1,264 @@
 import mlflow.pyfunc
 import pandas as pd
 import numpy as np
+import os
+import time
+from collections import Counter
 from app.utils import mlflow_logger
+from app.quantization import QuantizedRepresentations, PRECISIONS
 import pickle
 
+# Precisão dos embeddings mantidos em memória para pontuação: float32, float16 ou int8
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "float32")
+
 def load_model(model_uri: str):
     """
     Carrega o modelo do MLflow.
     """
     return mlflow.pyfunc.load_model(model_uri)
 
+_item_mapping_cache = {}
+
+def build_item_mapping(news_data: pd.DataFrame):
+    """
+    Cria (e guarda em cache por DataFrame) o mapeamento entre IDs de notícias (page)
+    e índices internos do modelo.
+
+    Args:
+        news_data (pd.DataFrame): DataFrame com os dados das notícias.
+
+    Returns:
+        tuple: (item_id_mapping, reverse_item_id_mapping)
+    """
+    cached = _item_mapping_cache.get(id(news_data))
+    if cached is not None and cached[0] is news_data:
+        return cached[1]
+
+    item_id_mapping = {item_id: i for i, item_id in enumerate(news_data['page'].unique())}
+    reverse_item_id_mapping = {i: item_id for item_id, i in item_id_mapping.items()}
+    if len(_item_mapping_cache) >= 4:
+        _item_mapping_cache.clear()
+    _item_mapping_cache[id(news_data)] = (news_data, (item_id_mapping, reverse_item_id_mapping))
+    return item_id_mapping, reverse_item_id_mapping
+
+
+def unwrap_lightfm(model):
+    """
+    Retorna o modelo LightFM "cru" e as matrizes de features associadas, aceitando
+    um LightFM, um LightFMWrapper ou um modelo pyfunc carregado do MLflow.
+    """
+    if hasattr(model, "unwrap_python_model"):
+        model = model.unwrap_python_model()
+    item_features = getattr(model, "item_features", None)
+    user_features = getattr(model, "user_features", None)
+    if hasattr(model, "model") and hasattr(model.model, "get_user_representations"):
+        model = model.model
+    return model, item_features, user_features
+
+
+class ModelRepresentations:
+    """
+    Representações latentes (biases + embeddings) de usuários e itens de um modelo LightFM.
+    O score de um par (usuário, item) é o mesmo de `LightFM.predict`:
+    produto interno dos embeddings somado aos dois biases.
+    """
+
+    def __init__(self, user_biases, user_embeddings, item_biases, item_embeddings):
+        self.user_biases = user_biases
+        self.user_embeddings = user_embeddings
+        self.item_biases = item_biases
+        self.item_embeddings = item_embeddings
+
+    @classmethod
+    def from_model(cls, model):
+        lightfm_model, item_features, user_features = unwrap_lightfm(model)
+        if lightfm_model.user_embeddings is None or lightfm_model.item_embeddings is None:
+            raise ValueError("Os embeddings float32 do modelo foram liberados após a quantização "
+                             f"(EMBEDDING_PRECISION={EMBEDDING_PRECISION}).")
+        user_biases, user_embeddings = lightfm_model.get_user_representations(features=user_features)
+        item_biases, item_embeddings = lightfm_model.get_item_representations(features=item_features)
+        return cls(user_biases, user_embeddings, item_biases, item_embeddings)
+
+    @property
+    def n_items(self) -> int:
+        return self.item_embeddings.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return (self.user_biases.nbytes + self.user_embeddings.nbytes
+                + self.item_biases.nbytes + self.item_embeddings.nbytes)
+
+    def user_vectors(self, user_ids) -> np.ndarray:
+        return self.user_embeddings[np.asarray(user_ids)]
+
+    def item_vectors(self, item_ids) -> np.ndarray:
+        return self.item_embeddings[np.asarray(item_ids)]
+
+    def score(self, user_ids, item_ids=None) -> np.ndarray:
+        """
+        Calcula a matriz de scores (n_usuários x n_itens) com um único produto matricial.
+
+        Args:
+            user_ids (array-like): IDs inteiros dos usuários.
+            item_ids (array-like, opcional): IDs inteiros dos itens. Todos os itens se None.
+
+        Returns:
+            np.ndarray: Matriz de scores.
+        """
+        user_ids = np.asarray(user_ids)
+        item_embeddings = self.item_embeddings
+        item_biases = self.item_biases
+        if item_ids is not None:
+            item_embeddings = item_embeddings[item_ids]
+            item_biases = item_biases[item_ids]
+
+        scores = self.user_embeddings[user_ids] @ item_embeddings.T
+        scores += self.user_biases[user_ids][:, None]
+        scores += item_biases[None, :]
+        return scores
+
+
+_representations_cache = {}
+
+def get_representations(model, precision: str = None):
+    """
+    Retorna (e guarda em cache por instância de modelo) as representações latentes do modelo.
+
+    Com precisão quantizada e sem matrizes de features, as representações float32 são os
+    próprios arrays do LightFM: eles são liberados após a quantização, para que a cópia
+    quantizada substitua a float32 em memória. A partir daí, toda pontuação do modelo deve
+    passar pelas representações.
+
+    Args:
+        model: The LightFM model.
+        precision (str): float32, float16 ou int8. Se None, usa `EMBEDDING_PRECISION`.
+
+    Returns:
+        ModelRepresentations | QuantizedRepresentations: Representações para pontuação.
+    """
+    precision = precision or EMBEDDING_PRECISION
+    key = (id(model), precision)
+    cached = _representations_cache.get(key)
+    if cached is not None and cached[0] is model:
+        return cached[1]
+
+    representations = ModelRepresentations.from_model(model)
+    if precision != "float32":
+        representations = QuantizedRepresentations.from_representations(representations, precision)
+        lightfm_model, item_features, user_features = unwrap_lightfm(model)
+        if item_features is None and user_features is None:
+            lightfm_model.user_embeddings = None
+            lightfm_model.item_embeddings = None
+    # Mantém apenas os modelos mais recentes (ex.: após /update_model)
+    if len(_representations_cache) >= 4:
+        _representations_cache.clear()
+    _representations_cache[key] = (model, representations)
+    return representations
+
+
+def quantization_report(model, news_data: pd.DataFrame, n_known_users: int, k: int = 10, recall_k: int = 50,
+                        n_users: int = 1000, batch_size: int = 64, precisions=PRECISIONS, seed: int = 42) -> dict:
+    """
+    Compara as representações quantizadas com as float32 numa amostra de usuários.
+
+    A amostra vem apenas dos `n_known_users` usuários do mapeamento (sem as linhas de
+    features de usuários), e a pontuação considera apenas os itens do catálogo. O top-k
+    é extraído lote a lote, sem materializar a matriz de scores da amostra inteira.
+
+    Para cada precisão são reportados:
+        - overlap_at_k: fração do top-k float32 presente no top-k quantizado.
+        - recall_at_k: fração do top-k float32 presente no top-`recall_k` quantizado.
+        - memory_bytes: memória dos biases e embeddings.
+        - latency_ms: tempo médio para pontuar um lote de `batch_size` usuários contra o catálogo.
+
+    Returns:
+        dict: Dicionário com status e as métricas por precisão.
+    """
+    reference = ModelRepresentations.from_model(model)
+    item_id_mapping, _ = build_item_mapping(news_data)
+    item_ids = np.arange(len(item_id_mapping))
+    n_known_users = min(n_known_users, reference.user_embeddings.shape[0])
+    user_ids = np.random.default_rng(seed).choice(n_known_users, size=min(n_users, n_known_users), replace=False)
+    batches = [user_ids[start:start + batch_size] for start in range(0, len(user_ids), batch_size)]
+    reference_top = np.vstack([top_k_indices(reference.score(batch, item_ids), k) for batch in batches])
+
+    report = {}
+    for precision in precisions:
+        if precision == "float32":
+            representations = reference
+        else:
+            representations = QuantizedRepresentations.from_representations(reference, precision)
+
+        scoring_seconds, top = 0.0, []
+        for batch in batches:
+            started = time.perf_counter()
+            scores = representations.score(batch, item_ids)
+            scoring_seconds += time.perf_counter() - started
+            top.append(top_k_indices(scores, max(k, recall_k)))
+        latency_ms = scoring_seconds * 1000 / len(batches)
+
+        top = np.vstack(top)
+        overlap = [len(np.intersect1d(ref, row[:k])) / k for ref, row in zip(reference_top, top)]
+        recall = [len(np.intersect1d(ref, row[:recall_k])) / k for ref, row in zip(reference_top, top)]
+
+        report[precision] = {
+            f"overlap_at_{k}": float(np.mean(overlap)),
+            f"recall_at_{k}": float(np.mean(recall)),
+            "memory_bytes": int(representations.nbytes),
+            "latency_ms": latency_ms,
+        }
+
+    return {"status": "success", "n_users": len(user_ids), "recall_depth": recall_k, "report": report}
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Retorna, para cada linha de `scores`, os índices dos k maiores valores em ordem decrescente.
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=int)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def predict_recommendations_batch(model, user_ids: list, news_data: pd.DataFrame, top_n: int = 10, catalog=None):
+    """
+    Gera recomendações para vários usuários de uma só vez, pontuando o catálogo
+    inteiro com um único produto matricial.
+
+    Args:
+        model: The LightFM model.
+        user_ids (list): IDs inteiros dos usuários.
+        news_data (pd.DataFrame): DataFrame com os dados das notícias.
+        top_n (int): Número de recomendações por usuário.
+        catalog (CatalogVersion, opcional): Versão do catálogo; as notícias ingeridas também são pontuadas.
+
+    Returns:
+        list: Uma lista de IDs recomendados para cada usuário, na mesma ordem de `user_ids`.
+    """
+    _, reverse_item_id_mapping = build_item_mapping(news_data)
+    representations = get_representations(model)
+    n_items = min(len(reverse_item_id_mapping), representations.n_items)
+
+    scores = representations.score(user_ids, np.arange(n_items))
+    if catalog is not None and catalog.n_extra:
+        scores = np.hstack([scores, catalog.score_extra(representations, model, user_ids)])
+
+    ranked = top_k_indices(scores, top_n)
+    return [[_page_at(i, n_items, reverse_item_id_mapping, catalog) for i in row] for row in ranked]
+
+
+def _page_at(column: int, n_items: int, reverse_item_id_mapping: dict, catalog=None):
+    # Colunas além dos itens do modelo correspondem às notícias ingeridas no catálogo
+    if column < n_items:
+        return reverse_item_id_mapping[column]
+    return catalog.page_at(catalog.n_base + column - n_items)
+
 @mlflow_logger("news_recommendation")
-def predict_recommendations(model, user_id: int, history: list, news_data: pd.DataFrame):
+def predict_recommendations(model, user_id: int, history: list, news_data: pd.DataFrame, top_n: int = 10,
+                            pipeline=None, n_candidates: int = 300, catalog=None):
     """
     Faz a previsão das recomendações baseado no histórico do usuário.
 
@@ -20,6 +267,11 @@ def predict_recommendations(model, user_id: int, history: list, news_data: pd.Da
         user_id (int): O ID do usuário.
         history (list): Lista de IDs dos artigos que o usuário interagiu.
         news_data (pd.DataFrame): DataFrame com os dados das notícias.
+        top_n (int): Número de recomendações retornadas.
+        pipeline (RetrievalPipeline, opcional): Pipeline de candidatos + re-ranqueamento.
+            Se None, todos os itens do catálogo são pontuados.
+        n_candidates (int): Número de candidatos gerados pelo pipeline.
+        catalog (CatalogVersion, opcional): Versão do catálogo; as notícias ingeridas também são pontuadas.
 
     Returns:
         list: Lista de IDs recomendados.
@@ -27,31 +279,32 @@ def predict_recommendations(model, user_id: int, history: list, news_data: pd.Da
 
     try:
         # Criar o mapeamento de IDs de item
-        item_id_mapping = {item_id: i for i, item_id in enumerate(news_data['page'].unique())}
-        reverse_item_id_mapping = {i: item_id for item_id, i in item_id_mapping.items()}
+        item_id_mapping, reverse_item_id_mapping = build_item_mapping(news_data)
         n_items = len(item_id_mapping)
 
-        # Criar matriz esparsa das interações do usuário
-        interactions = np.zeros(n_items)
-        for item_id_str in history:
-            if item_id_str in item_id_mapping:  
-                interactions[item_id_mapping[item_id_str]] = 1
+        if pipeline is not None:
+            history_ids = [item_id_mapping[item_id_str] for item_id_str in history if item_id_str in item_id_mapping]
+            ranked_item_ids = pipeline.recommend(model, user_id, history_ids, n_candidates=n_candidates, k=top_n)
+            return [reverse_item_id_mapping[i] for i in ranked_item_ids]
 
         # Passar todos os itens para predição
         item_ids = np.arange(n_items)  # Todos os itens possíveis
 
-        # Ajustar o tamanho do user_ids para corresponder ao número de item_ids
-        user_ids = np.full_like(item_ids, user_id)
-        
-        # Fazer previsão correta
-        predictions = model.predict(user_ids, item_ids)
+        # Pontua pelas representações do modelo (mesmo score de LightFM.predict), o que aceita
+        # LightFM, LightFMWrapper ou o pyfunc carregado do MLflow
+        representations = get_representations(model)
+        predictions = representations.score([user_id], item_ids)[0]
+
+        # Pontuar também as notícias ingeridas após o treino
+        if catalog is not None and catalog.n_extra:
+            extra = catalog.score_extra(representations, model, [user_id])[0]
+            predictions = np.concatenate([predictions, extra])
 
         # Ordenar os itens com maiores scores
         ranked_item_ids = np.argsort(-predictions)
 
         # Selecionar os top-N recomendados
-        top_n = 10  
-        recommended_item_ids = [reverse_item_id_mapping[i] for i in ranked_item_ids[:top_n]]
+        recommended_item_ids = [_page_at(i, n_items, reverse_item_id_mapping, catalog) for i in ranked_item_ids[:top_n]]
 
         return recommended_item_ids
 
@@ -61,18 +314,21 @@ def predict_recommendations(model, user_id: int, history: list, news_data: pd.Da
 
 
 
-def cold_start_recommendations(news_data: pd.DataFrame, top_n: int = 10):
+def cold_start_recommendations(news_data: pd.DataFrame, top_n: int = 10, catalog=None):
     """
     Retorna recomendações padrão para novos usuários (cold-start) based on most popular news.
 
     Args:
         news_data (pd.DataFrame): The news data DataFrame.
         top_n (int): The number of recommendations to return.
+        catalog (CatalogVersion, optional): Catalog version; ingested news are ranked too.
 
     Returns:
         list: A list of recommended item IDs.
     """
     try:
+        if catalog is not None:
+            return catalog.popular(top_n)
         # Assuming news_data has a 'view_count' or similar column
         # Replace 'view_count' with the actual column name
         most_popular = news_data.sort_values(by='count', ascending=False)['page'].head(top_n).tolist()
@@ -82,6 +338,20 @@ def cold_start_recommendations(news_data: pd.DataFrame, top_n: int = 10):
         return ["Notícia 1", "Notícia 2", "Notícia 3"] # Fallback
 
 
+def history_recommendations(history: list, top_n: int = 10):
+    """
+    Retorna as notícias mais lidas pelo próprio usuário (mesma heurística de avaliacao/topk.py).
+
+    Args:
+        history (list): Lista de IDs dos artigos que o usuário interagiu.
+        top_n (int): Número de recomendações retornadas.
+
+    Returns:
+        list: Lista de IDs recomendados.
+    """
+    return [item for item, _ in Counter(history).most_common(top_n)]
+
+
 # Use essa função para resgatar o histórico de qualquer usuário com apenas o id de usuário
 def get_user_history(userId: str, data: pd.DataFrame, user_id_mapping: dict):
     """
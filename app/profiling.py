@@ -0,0 +1,205 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+
+# Perfil da requisição atual (None quando a requisição não está sendo perfilada)
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+# Desligado por padrão: sem o middleware, `profile_section` retorna um contexto nulo compartilhado
+ENABLED = False
+_NULL_CONTEXT = nullcontext()
+
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem: uma thread auxiliar lê periodicamente a pilha de cada thread
+    registrada e conta as pilhas no formato "collapsed" (compatível com flamegraph.pl/speedscope),
+    com o nome da thread como primeiro frame.
+
+    As threads são registradas enquanto trabalham para a requisição (`add_thread`/`remove_thread`).
+    A amostra é da thread inteira: se ela atende outras requisições ao mesmo tempo (o event loop,
+    ou um lote do micro-batching), as pilhas delas também aparecem.
+    """
+
+    def __init__(self, thread_id: int, interval_ms: float = 5.0):
+        self.interval = interval_ms / 1000
+        self.samples = Counter()
+        self._threads = Counter()
+        self._names = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.add_thread(thread_id)
+
+    def add_thread(self, thread_id: int):
+        with self._lock:
+            self._threads[thread_id] += 1
+            self._names[thread_id] = next((thread.name for thread in threading.enumerate() if thread.ident == thread_id), str(thread_id))
+
+    def remove_thread(self, thread_id: int):
+        with self._lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = [(thread_id, self._names[thread_id]) for thread_id in self._threads]
+            frames = sys._current_frames()
+            for thread_id, name in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(f"thread:{name}")
+                    self.samples[";".join(reversed(stack))] += 1
+
+
+class RequestProfile:
+    """
+    Perfil de uma requisição: amostras do profiler e tempos das seções instrumentadas.
+    """
+
+    def __init__(self, method: str, path: str, interval_ms: float):
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.sections = {}
+        self.profiler = SamplingProfiler(threading.get_ident(), interval_ms)
+
+    def add_section(self, name: str, elapsed_ms: float):
+        self.sections[name] = self.sections.get(name, 0.0) + elapsed_ms
+
+    def to_dict(self, duration_ms: float, status_code: int) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": duration_ms,
+            "status_code": status_code,
+            "interval_ms": self.profiler.interval * 1000,
+            "sections_ms": self.sections,
+            "samples": dict(self.profiler.samples.most_common()),
+        }
+
+
+class _Section:
+    def __init__(self, profile: RequestProfile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile.add_section(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class _ThreadRegistration:
+    def __init__(self, profiles):
+        self.profiles = profiles
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        for profile in self.profiles:
+            profile.profiler.add_thread(self.thread_id)
+
+    def __exit__(self, *exc):
+        for profile in self.profiles:
+            profile.profiler.remove_thread(self.thread_id)
+        return False
+
+
+def current_profile():
+    """
+    Perfil da requisição atual, ou None se ela não estiver sendo perfilada.
+    """
+    return _current_profile.get() if ENABLED else None
+
+
+def profile_thread(*profiles):
+    """
+    Registra a thread atual nos perfis informados enquanto o bloco executa, para que as
+    suas pilhas sejam amostradas. Usado pelas threads que trabalham para uma requisição.
+    """
+    profiles = [profile for profile in profiles if profile is not None]
+    if not profiles:
+        return _NULL_CONTEXT
+    return _ThreadRegistration(profiles)
+
+
+def profile_section(name: str):
+    """
+    Mede o tempo de uma seção da requisição, se ela estiver sendo perfilada.
+    """
+    if not ENABLED:
+        return _NULL_CONTEXT
+    profile = _current_profile.get()
+    if profile is None:
+        return _NULL_CONTEXT
+    return _Section(profile, name)
+
+
+class ProfileStore:
+    """
+    Diretório local limitado a `max_files` perfis; os mais antigos são removidos.
+    """
+
+    def __init__(self, directory: str, max_files: int = 100):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, profile: dict) -> str:
+        path_slug = profile["path"].strip("/").replace("/", "_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(profile['started_at']))}_{path_slug}_{uuid.uuid4().hex[:8]}.json"
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+            json.dump(profile, f)
+
+        with self._lock:
+            files = sorted(self.list(), key=lambda item: item["modified_at"])
+            for item in files[:max(0, len(files) - self.max_files)]:
+                os.remove(os.path.join(self.directory, item["name"]))
+        return name
+
+    def list(self) -> list:
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                profiles.append({"name": entry.name, "size_bytes": stat.st_size, "modified_at": stat.st_mtime})
+        return sorted(profiles, key=lambda item: item["modified_at"], reverse=True)
+
+    def path(self, name: str):
+        """Caminho de um perfil salvo, ou None se o nome for inválido ou não existir."""
+        if os.path.basename(name) != name or not name.endswith(".json"):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+def start_profile(method: str, path: str, interval_ms: float) -> RequestProfile:
+    profile = RequestProfile(method, path, interval_ms)
+    _current_profile.set(profile)
+    profile.profiler.start()
+    return profile
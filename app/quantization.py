@@ -0,0 +1,108 @@
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# Número de linhas de itens convertidas para float32 por vez durante a pontuação
+SCORING_CHUNK_SIZE = 4096
+
+
+class QuantizedMatrix:
+    """
+    Matriz de embeddings armazenada em float16 ou em int8 com uma escala por linha.
+
+    Em int8, cada linha é representada por `values * scale`, com
+    `scale = max(|linha|) / 127`.
+    """
+
+    def __init__(self, values: np.ndarray, scales: np.ndarray = None):
+        self.values = values
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, matrix: np.ndarray, precision: str):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if precision == "float32":
+            return cls(matrix)
+        if precision == "float16":
+            return cls(matrix.astype(np.float16))
+        if precision == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127
+            scales[scales == 0] = 1
+            values = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+            return cls(values, scales.astype(np.float32))
+        raise ValueError(f"Precisão inválida: {precision}. Use uma de {PRECISIONS}.")
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def rows(self, ids=None) -> np.ndarray:
+        """Linhas (todas se `ids` for None) convertidas para float32."""
+        values = self.values if ids is None else self.values[ids]
+        rows = values.astype(np.float32)
+        if self.scales is not None:
+            scales = self.scales if ids is None else self.scales[ids]
+            rows *= scales[:, None]
+        return rows
+
+
+class QuantizedRepresentations:
+    """
+    Representações latentes com embeddings quantizados; os biases continuam em float32.
+    Tem a mesma interface de pontuação de `ModelRepresentations`.
+    """
+
+    def __init__(self, user_biases, user_embeddings: QuantizedMatrix, item_biases, item_embeddings: QuantizedMatrix, precision: str):
+        self.user_biases = user_biases
+        self.user_embeddings = user_embeddings
+        self.item_biases = item_biases
+        self.item_embeddings = item_embeddings
+        self.precision = precision
+
+    @classmethod
+    def from_representations(cls, representations, precision: str):
+        return cls(
+            np.asarray(representations.user_biases, dtype=np.float32),
+            QuantizedMatrix.quantize(representations.user_embeddings, precision),
+            np.asarray(representations.item_biases, dtype=np.float32),
+            QuantizedMatrix.quantize(representations.item_embeddings, precision),
+            precision,
+        )
+
+    @property
+    def n_items(self) -> int:
+        return self.item_embeddings.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return (self.user_biases.nbytes + self.user_embeddings.nbytes
+                + self.item_biases.nbytes + self.item_embeddings.nbytes)
+
+    def user_vectors(self, user_ids) -> np.ndarray:
+        return self.user_embeddings.rows(np.asarray(user_ids))
+
+    def item_vectors(self, item_ids) -> np.ndarray:
+        return self.item_embeddings.rows(np.asarray(item_ids))
+
+    def score(self, user_ids, item_ids=None) -> np.ndarray:
+        """
+        Calcula a matriz de scores diretamente sobre os arrays quantizados.
+
+        Os itens são processados em blocos: cada bloco é convertido para float32 apenas
+        durante o seu produto matricial, mantendo a memória de trabalho limitada.
+        """
+        user_ids = np.asarray(user_ids)
+        user_vectors = self.user_vectors(user_ids)
+        item_ids = np.arange(self.n_items) if item_ids is None else np.asarray(item_ids)
+
+        scores = np.empty((len(user_ids), len(item_ids)), dtype=np.float32)
+        for start in range(0, len(item_ids), SCORING_CHUNK_SIZE):
+            chunk = item_ids[start:start + SCORING_CHUNK_SIZE]
+            scores[:, start:start + len(chunk)] = user_vectors @ self.item_embeddings.rows(chunk).T
+        scores += self.user_biases[user_ids][:, None]
+        scores += self.item_biases[item_ids][None, :]
+        return scores
@@ -0,0 +1,174 @@
+"""
+Replay do tráfego capturado do /predict contra duas versões do modelo registradas no MLflow.
+
+Uso:
+    python -m app.replay captures/predict.jsonl --baseline 3 --candidate 4 --speedup 2
+"""
+import argparse
+import json
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.metrics import Metrics
+from app.mlflow_utils import load_model_version
+from app.model_utils import (
+    predict_recommendations,
+    cold_start_recommendations,
+    get_user_history,
+    build_item_mapping
+)
+from app.retrieval import build_pipeline
+
+# Sem o decorador mlflow_logger: o replay não deve abrir um run no MLflow por requisição
+_predict = predict_recommendations.__wrapped__
+
+
+def load_capture(path: str, limit: int = None) -> list:
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+            if limit and len(entries) >= limit:
+                break
+    return sorted(entries, key=lambda entry: entry["timestamp"])
+
+
+def overlap(a: list, b: list, k: int) -> float:
+    if k <= 0:
+        return 1.0
+    return len(set(a[:k]) & set(b[:k])) / k
+
+
+class Replayer:
+    """
+    Reproduz as requisições capturadas, pontuando cada uma como o /predict faria ao vivo.
+    """
+
+    def __init__(self, user_data, news_data):
+        self.user_data = user_data
+        self.news_data = news_data
+        self.user_id_mapping = {user_id: i for i, user_id in enumerate(user_data['userId'].unique())}
+        item_id_mapping, _ = build_item_mapping(news_data)
+        self.pipeline = build_pipeline(news_data, user_data, item_id_mapping)
+
+    def serve(self, model, entry: dict) -> list:
+        k = entry.get("k") or 10
+        n_candidates = entry.get("n_candidates") or 0
+        history_data = get_user_history(entry["user_id"], self.user_data, self.user_id_mapping)
+        if history_data is None:
+            return cold_start_recommendations(self.news_data, top_n=k)
+
+        history, integer_user_id = history_data
+        if n_candidates > 0:
+            recommendations = _predict(model, integer_user_id, history, self.news_data, top_n=k,
+                                       pipeline=self.pipeline, n_candidates=n_candidates)
+        else:
+            recommendations = _predict(model, integer_user_id, history, self.news_data, top_n=k)
+        if isinstance(recommendations, dict):
+            raise RuntimeError(recommendations.get("message"))
+        return recommendations
+
+    def run(self, model, entries: list, speedup: float = 1.0, workers: int = 8) -> dict:
+        """
+        Reproduz as requisições no ritmo original dividido por `speedup` (0 = sem espera).
+
+        A latência é medida a partir do instante programado da requisição, incluindo
+        o tempo de fila quando os workers estão ocupados.
+        """
+        first = entries[0]["timestamp"]
+        offsets = [(entry["timestamp"] - first) / speedup if speedup > 0 else 0 for entry in entries]
+        metrics = Metrics(max_samples=len(entries))
+
+        def timed(entry, scheduled):
+            try:
+                recommendations = self.serve(model, entry)
+            except Exception as e:
+                print(f"❌ Erro no replay de user_id={entry['user_id']}: {e}")
+                metrics.increment("errors")
+                recommendations = None
+            metrics.observe("latency_ms", (time.perf_counter() - scheduled) * 1000)
+            return recommendations
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for entry, offset in zip(entries, offsets):
+                scheduled = started + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(timed, entry, scheduled))
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        snapshot = metrics.snapshot()
+        return {
+            "results": results,
+            "latency_ms": snapshot["summaries"].get("latency_ms", {}),
+            "throughput_rps": len(entries) / elapsed if elapsed > 0 else None,
+            "errors": snapshot["counters"].get("errors", 0),
+        }
+
+
+def compare(replayer: Replayer, models: dict, entries: list, speedup: float, workers: int) -> dict:
+    """
+    Reproduz o tráfego contra cada versão e compara latência, throughput e top-k.
+    """
+    report = {"requests": len(entries), "speedup": speedup, "versions": {}}
+    results = {}
+    for version, model in models.items():
+        run = replayer.run(model, entries, speedup=speedup, workers=workers)
+        results[version] = run.pop("results")
+        # Só as respostas pontuadas pelo modelo ao vivo são comparáveis (não as de fallback)
+        captured = [overlap(recs, entry["response"]["recommendations"], entry.get("k") or 10)
+                    for recs, entry in zip(results[version], entries)
+                    if recs is not None and entry["response"].get("tier") == "model"]
+        run["overlap_with_capture"] = float(np.mean(captured)) if captured else None
+        report["versions"][version] = run
+
+    baseline, candidate = list(results)
+    overlaps = [overlap(a, b, entry.get("k") or 10)
+                for a, b, entry in zip(results[baseline], results[candidate], entries)
+                if a is not None and b is not None]
+    report["top_k_overlap"] = float(np.mean(overlaps)) if overlaps else None
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay do tráfego capturado contra duas versões do modelo.")
+    parser.add_argument("capture", help="Arquivo JSONL gerado com CAPTURE_ENABLED=1")
+    parser.add_argument("--baseline", required=True, help="Versão atual do modelo no registro")
+    parser.add_argument("--candidate", required=True, help="Versão candidata do modelo no registro")
+    parser.add_argument("--model-name", default="recommendation_model")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Fator de aceleração do ritmo original (0 = sem espera)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--user-data", default="data/user_part_0.pkl")
+    parser.add_argument("--news-data", default="data/news_label_0.pkl")
+    args = parser.parse_args()
+    if args.baseline == args.candidate:
+        raise SystemExit("As versões comparadas devem ser diferentes.")
+
+    models = {}
+    for version in (args.baseline, args.candidate):
+        response = load_model_version(args.model_name, version)
+        if response["status"] != "success":
+            raise SystemExit(response["message"])
+        # A pontuação extrai o LightFM (e as features registradas) do pyfunc via get_representations
+        models[version] = response["model"]
+
+    with open(args.user_data, "rb") as f:
+        user_data = pickle.load(f)
+    with open(args.news_data, "rb") as f:
+        news_data = pickle.load(f)
+
+    entries = load_capture(args.capture, args.limit)
+    if not entries:
+        raise SystemExit("Nenhuma requisição capturada.")
+
+    report = compare(Replayer(user_data, news_data), models, entries, args.speedup, args.workers)
+    print(json.dumps(report, indent=2))
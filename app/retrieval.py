@@ -0,0 +1,219 @@
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from app.model_utils import get_representations, top_k_indices
+
+
+class PopularityCandidates:
+    """
+    Candidatos mais populares do catálogo, segundo a coluna `count`.
+    """
+
+    name = "popularity"
+
+    def __init__(self, news_data: pd.DataFrame, item_id_mapping: dict):
+        counts = news_data.drop_duplicates('page').set_index('page')['count'].fillna(0)
+        ranked_pages = counts.sort_values(ascending=False).index
+        self.ranked = np.array([item_id_mapping[page] for page in ranked_pages if page in item_id_mapping], dtype=int)
+
+    def generate(self, model, user_id: int, history_ids: list, n: int) -> np.ndarray:
+        return self.ranked[:n]
+
+
+class CoOccurrenceCandidates:
+    """
+    Candidatos item-a-item: notícias lidas próximas (dentro de uma janela) das notícias
+    do histórico do usuário, considerando os históricos de todos os usuários.
+
+    Args:
+        histories (iterable): Históricos de leitura (listas de IDs de notícias).
+        item_id_mapping (dict): Mapeamento page -> índice do item.
+        window (int): Distância máxima entre duas leituras para contarem como co-ocorrência.
+        max_neighbors (int): Número de vizinhos mantidos por item.
+        max_seeds (int): Número de itens mais recentes do histórico usados na busca.
+    """
+
+    name = "co_occurrence"
+
+    def __init__(self, histories, item_id_mapping: dict, window: int = 5, max_neighbors: int = 50, max_seeds: int = 20):
+        self.max_seeds = max_seeds
+        co_counts = defaultdict(Counter)
+        for history in histories:
+            ids = [item_id_mapping[item.strip()] for item in history if item.strip() in item_id_mapping]
+            for i, item in enumerate(ids):
+                for neighbor in ids[max(0, i - window):i]:
+                    if neighbor != item:
+                        co_counts[item][neighbor] += 1
+                        co_counts[neighbor][item] += 1
+
+        self.neighbors = {item: counter.most_common(max_neighbors) for item, counter in co_counts.items()}
+
+    def generate(self, model, user_id: int, history_ids: list, n: int) -> np.ndarray:
+        scores = Counter()
+        for item in history_ids[-self.max_seeds:]:
+            for neighbor, count in self.neighbors.get(item, ()):
+                scores[neighbor] += count
+        return np.array([item for item, _ in scores.most_common(n)], dtype=int)
+
+
+class EmbeddingIndex:
+    """
+    Índice aproximado (IVF) dos embeddings dos itens do catálogo.
+
+    Os itens são agrupados por k-means sobre os embeddings normalizados, com o bias do item
+    como dimensão extra (o usuário entra com 1 nessa dimensão). Na busca, só os grupos cujo
+    centróide tem maior produto com o usuário são pontuados, de modo que o custo cresce com
+    a raiz do tamanho do catálogo, e não linearmente.
+
+    Args:
+        representations: Representações do modelo (float32 ou quantizadas).
+        n_items (int): Número de itens do catálogo (linhas de features são ignoradas).
+        n_clusters (int): Número de grupos. Se None, usa ~sqrt(n_items).
+        n_iterations (int): Iterações do k-means.
+    """
+
+    def __init__(self, representations, n_items: int, n_clusters: int = None, n_iterations: int = 10, seed: int = 42):
+        item_ids = np.arange(n_items)
+        vectors = np.hstack([representations.item_vectors(item_ids), representations.item_biases[item_ids][:, None]])
+        normalized = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-10, None)
+        n_clusters = min(n_clusters or max(1, int(np.sqrt(n_items))), n_items)
+
+        rng = np.random.default_rng(seed)
+        centroids = normalized[rng.choice(n_items, size=n_clusters, replace=False)]
+        for _ in range(n_iterations):
+            assignments = self._assign(normalized, centroids)
+            for cluster in range(n_clusters):
+                members = normalized[assignments == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-10)
+
+        assignments = self._assign(normalized, centroids)
+        self.centroids = centroids
+        self.clusters = [np.flatnonzero(assignments == cluster) for cluster in range(n_clusters)]
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        return np.concatenate([np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+                               for start in range(0, len(vectors), chunk_size)])
+
+    def search(self, representations, user_id: int, n: int, probe_factor: int = 3) -> np.ndarray:
+        """
+        Retorna os n melhores itens entre os grupos sondados (ao menos `probe_factor * n` itens).
+        """
+        user_vector = np.append(representations.user_vectors([user_id])[0], 1.0)
+        probed, n_probed = [], 0
+        for cluster in np.argsort(-(self.centroids @ user_vector)):
+            if n_probed >= probe_factor * n:
+                break
+            probed.append(self.clusters[cluster])
+            n_probed += len(self.clusters[cluster])
+
+        candidates = np.concatenate(probed)
+        scores = representations.score([user_id], candidates)
+        return candidates[top_k_indices(scores, n)[0]]
+
+
+class EmbeddingCandidates:
+    """
+    Candidatos pelo produto entre o embedding latente do usuário e os dos itens, usando
+    as representações em cache (possivelmente quantizadas) e um índice aproximado
+    construído uma vez por modelo.
+
+    O índice deve ser construído com `prepare` antes de o modelo passar a servir; os índices
+    dos dois modelos mais recentes são mantidos, para a troca de modelo não forçar reconstruções.
+    """
+
+    name = "embedding"
+
+    def __init__(self, n_items: int):
+        self.n_items = n_items
+        self._lock = threading.Lock()
+        self._indexes = ()
+
+    def index(self, model, representations) -> EmbeddingIndex:
+        for cached in self._indexes:
+            if cached[0] is model and cached[1] is representations:
+                return cached[2]
+        with self._lock:
+            for cached in self._indexes:
+                if cached[0] is model and cached[1] is representations:
+                    return cached[2]
+            n_items = min(self.n_items, representations.n_items)
+            index = EmbeddingIndex(representations, n_items)
+            self._indexes = ((model, representations, index),) + self._indexes[:1]
+            return index
+
+    def prepare(self, model):
+        self.index(model, get_representations(model))
+
+    def generate(self, model, user_id: int, history_ids: list, n: int) -> np.ndarray:
+        representations = get_representations(model)
+        return self.index(model, representations).search(representations, user_id, n)
+
+
+class RetrievalPipeline:
+    """
+    Pipeline de recomendação em dois estágios:
+
+    1. Geração de candidatos barata a partir de várias fontes, intercaladas e sem duplicatas.
+    2. Re-ranqueamento apenas dos candidatos com o modelo LightFM completo (incluindo features),
+       pelas representações do modelo (na precisão de `EMBEDDING_PRECISION`).
+
+    Args:
+        sources (list): Fontes de candidatos, com o método `generate(model, user_id, history_ids, n)`.
+    """
+
+    def __init__(self, sources: list):
+        self.sources = sources
+
+    def prepare(self, model):
+        """
+        Constrói as estruturas das fontes que dependem do modelo (ex.: índice de embeddings),
+        fora do caminho das requisições.
+        """
+        for source in self.sources:
+            if hasattr(source, "prepare"):
+                source.prepare(model)
+
+    def candidates(self, model, user_id: int, history_ids: list, n_candidates: int) -> np.ndarray:
+        generated = []
+        for source in self.sources:
+            try:
+                generated.append(source.generate(model, user_id, history_ids, n_candidates))
+            except Exception as e:
+                print(f"Erro na fonte de candidatos '{source.name}': {e}")
+
+        # Intercala as fontes (round-robin) para que nenhuma domine os candidatos
+        merged = {}
+        for rank in range(n_candidates):
+            for items in generated:
+                if rank < len(items):
+                    merged.setdefault(int(items[rank]), None)
+            if len(merged) >= n_candidates:
+                break
+        return np.fromiter(merged, dtype=np.int32, count=len(merged))[:n_candidates]
+
+    def rerank(self, model, user_id: int, candidates: np.ndarray, k: int) -> np.ndarray:
+        scores = get_representations(model).score([user_id], candidates)[0]
+        return candidates[np.argsort(-scores)[:k]]
+
+    def recommend(self, model, user_id: int, history_ids: list, n_candidates: int = 300, k: int = 10) -> np.ndarray:
+        candidates = self.candidates(model, user_id, history_ids, max(n_candidates, k))
+        if len(candidates) == 0:
+            return candidates
+        return self.rerank(model, user_id, candidates, k)
+
+
+def build_pipeline(news_data: pd.DataFrame, user_data: pd.DataFrame, item_id_mapping: dict) -> RetrievalPipeline:
+    """
+    Monta o pipeline padrão: popularidade, co-ocorrência nos históricos e embeddings.
+    """
+    sources = [PopularityCandidates(news_data, item_id_mapping)]
+    if user_data is not None:
+        sources.append(CoOccurrenceCandidates(user_data['history'], item_id_mapping))
+    sources.append(EmbeddingCandidates(len(item_id_mapping)))
+    return RetrievalPipeline(sources)
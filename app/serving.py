@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.profiling import current_profile, profile_thread
+
+
+class ResultCache:
+    """
+    Cache LRU das últimas recomendações calculadas ao vivo, usado como fallback.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class DeadlineExceeded(Exception):
+    """O prazo da requisição acabou (ou não há capacidade) antes do fim da pontuação."""
+
+
+class DeadlineRunner:
+    """
+    Executa funções bloqueantes numa thread, limitadas ao prazo da requisição.
+
+    O número de execuções em andamento é limitado a `max_inflight`. Uma execução só
+    libera a sua vaga quando a thread termina de fato, mesmo que o chamador já tenha
+    desistido por prazo. Sem vaga disponível, a chamada falha na hora (load shedding)
+    em vez de entrar numa fila.
+
+    A função executa no contexto (contextvars) do chamador, e a thread do pool é
+    registrada no perfil da requisição, se ela estiver sendo perfilada.
+    """
+
+    def __init__(self, max_inflight: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="predict")
+        self._slots = threading.BoundedSemaphore(max_inflight)
+
+    async def run(self, deadline: float, func, *args, **kwargs):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise DeadlineExceeded("Prazo esgotado antes da pontuação.")
+        if not self._slots.acquire(blocking=False):
+            raise DeadlineExceeded("Sem capacidade para pontuação ao vivo.")
+
+        future = self._executor.submit(contextvars.copy_context().run, _run_profiled, func, *args, **kwargs)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Prazo de pontuação excedido.")
+
+
+def _run_profiled(func, *args, **kwargs):
+    with profile_thread(current_profile()):
+        return func(*args, **kwargs)
+
+
+async def wait_with_deadline(deadline: float, awaitable):
+    """
+    Aguarda `awaitable` até o prazo informado (em `time.perf_counter()`).
+    """
+    remaining = deadline - time.perf_counter()
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("Prazo esgotado antes da pontuação.")
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Prazo de pontuação excedido.")
@@ -0,0 +1,62 @@
+import json
+import os
+
+import numpy as np
+
+
+class TopKStore:
+    """
+    Recomendações pré-calculadas (top-k códigos de itens por usuário) de uma versão do modelo.
+
+    Estrutura em disco, em `<diretório>/<versão do modelo>/`:
+        - topk.npy: matriz int32 (n_usuários x k), lida como memory-map; -1 marca posições vazias.
+        - users.json: IDs dos usuários, na ordem das linhas de topk.npy.
+        - items.json: IDs das notícias (page), indexados pelo código do item.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.codes = np.load(os.path.join(path, "topk.npy"), mmap_mode="r")
+        with open(os.path.join(path, "users.json"), encoding="utf-8") as f:
+            self.user_rows = {user_id: row for row, user_id in enumerate(json.load(f))}
+        with open(os.path.join(path, "items.json"), encoding="utf-8") as f:
+            self.items = json.load(f)
+
+    @property
+    def k(self) -> int:
+        return self.codes.shape[1]
+
+    @classmethod
+    def open(cls, directory: str, version):
+        """
+        Abre o store da versão informada, ou retorna None se ele não existir.
+        """
+        path = os.path.join(directory, str(version))
+        if not os.path.exists(os.path.join(path, "topk.npy")):
+            return None
+        return cls(path)
+
+    def get(self, user_id: str, top_n: int = None):
+        """
+        Retorna as recomendações pré-calculadas do usuário, ou None se ele não estiver no store.
+        """
+        row = self.user_rows.get(user_id)
+        if row is None:
+            return None
+        return [self.items[code] for code in self.codes[row, :top_n] if code >= 0]
+
+
+def create_store(directory: str, version, user_ids: list, items: list, k: int) -> np.memmap:
+    """
+    Cria os arquivos de um store e retorna a matriz memory-mapped de códigos para escrita.
+    """
+    path = os.path.join(directory, str(version))
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "users.json"), "w", encoding="utf-8") as f:
+        json.dump(user_ids, f)
+    with open(os.path.join(path, "items.json"), "w", encoding="utf-8") as f:
+        json.dump(items, f)
+
+    codes = np.lib.format.open_memmap(os.path.join(path, "topk.npy"), mode="w+", dtype=np.int32, shape=(len(user_ids), k))
+    codes[:] = -1
+    return codes
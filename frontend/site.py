@@ -1,6 +1,5 @@
 import streamlit as st
 import requests
-import pickle
 import html
 import re
 import os
@@ -16,20 +15,77 @@ MLFLOW_URL = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000")  # Se Fas
 API_URL = os.getenv("FASTAPI_URL", "http://localhost:8080")
 
 st.set_page_config(layout="wide")
+
+@st.cache_resource
+def get_session():
+    """Sessão HTTP reaproveitada entre reruns (mantém as conexões abertas)."""
+    return requests.Session()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_data_version():
+    """Versão dos dados da API; as demais funções em cache a recebem como chave."""
+    response = get_session().get(f"{API_URL}/data_version")
+    response.raise_for_status()
+    return response.json()["version"]
+
+def get_sampled_users(n=10):
+    """Amostra de usuários da API; chamada uma vez por sessão, sem cache compartilhado."""
+    response = get_session().get(f"{API_URL}/sample_users", params={"n": n})
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def get_news_index(version, pages):
+    """Busca somente os metadados das notícias recomendadas e os indexa por page."""
+    response = get_session().post(f"{API_URL}/news_metadata", json=list(pages))
+    response.raise_for_status()
+    return {item["page"]: item for item in response.json()}
+
+@st.cache_data(show_spinner=False)
+def get_cold_start(version):
+    response = get_session().get(f"{API_URL}/cold_start")
+    response.raise_for_status()
+    return response.json().get("recommendations", [])
+
+# Respostas degradadas (history, popularity, cached) não são guardadas, para não fixar
+# um fallback servido sob carga até a próxima versão dos dados
+CACHEABLE_TIERS = {"model", "precomputed"}
+
+def get_recommendations(version, user_id):
+    cache = st.session_state.setdefault("recommendations_cache", {})
+    key = (version, user_id)
+    if key in cache:
+        return cache[key]
+
+    response = get_session().post(f"{API_URL}/predict/{user_id}")
+    response.raise_for_status()
+    payload = response.json()
+    recommendations = payload.get("recommendations", [])
+    if payload.get("tier") in CACHEABLE_TIERS:
+        cache[key] = recommendations
+    return recommendations
+
 # Inicializa a sessão
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 
-# Inicializa IDs aleatórios
-with open("data/user_part_0.pkl", "rb") as f:
-    user_data =  pickle.load(f)
-    print("Debug: Dados de usuário carregados com sucesso!")
+try:
+    data_version = get_data_version()
+except requests.RequestException as e:
+    st.error(f"Erro ao buscar a versão dos dados: {e}")
+    data_version = None
 
-if "user_ids" not in st.session_state and not user_data.empty:
-    sampled_users = user_data['userId'].sample(n=min(10, len(user_data))).tolist()
-    st.session_state.user_ids = {f"user{i+1}": uid for i, uid in enumerate(sampled_users)}
-    st.session_state.user_id_keys = list(st.session_state.user_ids.keys())
-    st.session_state.user_index = 0
+# Inicializa IDs aleatórios (tenta de novo no próximo rerun se a API falhar ou não houver usuários)
+if "user_ids" not in st.session_state:
+    try:
+        sampled_users = get_sampled_users()
+    except requests.RequestException as e:
+        st.error(f"Erro ao buscar usuários: {e}")
+        sampled_users = []
+    if sampled_users:
+        st.session_state.user_ids = {f"user{i+1}": uid for i, uid in enumerate(sampled_users)}
+        st.session_state.user_id_keys = list(st.session_state.user_ids.keys())
+        st.session_state.user_index = 0
 
 def login():
     user_id_key = st.session_state.user_id_keys[st.session_state.user_index]
@@ -46,7 +102,7 @@ st.sidebar.header("📊 Monitoramento do Modelo")
 
 with st.sidebar:
     st.title("🔑 Login")
-    if st.button("Login"):
+    if st.button("Login", disabled="user_ids" not in st.session_state):
         login()
     
     st.header("📊 Monitoramento do Modelo")
@@ -78,12 +134,12 @@ with st.sidebar:
 
 st.title("🔍 Sistema de Recomendações")
 
-def display_news(news_data, recommendations):
+def display_news(news_index, recommendations):
     """Exibe notícias recomendadas de forma acessível."""
     st.subheader("Notícias Recomendadas")
     cols = st.columns(3)
     for index, rec in enumerate(recommendations):
-        noticia = next((item for item in news_data if item.get("page") == rec), None)
+        noticia = news_index.get(rec)
         if noticia:
             titulo = clean_text(noticia.get("title", "Título não disponível"))
             caption = clean_text(noticia.get("caption", "Legenda não disponível"))
@@ -100,26 +156,21 @@ def display_news(news_data, recommendations):
             with cols[index % 3]:
                 st.warning(f"Notícia não encontrada para {rec}")
 
-if not st.session_state.logged_in:
-    response = requests.get(f"{API_URL}/cold_start")
-    if response.status_code == 200:
-        recommendations = response.json().get("recommendations", [])
-        news_data_response = requests.get(f"{API_URL}/get_news_data")
-        if news_data_response.status_code == 200:
-            display_news(news_data_response.json(), recommendations)
-        else:
-            st.error(f"Erro ao buscar dados das notícias: {news_data_response.status_code}")
+def show_recommendations(recommendations):
+    try:
+        news_index = get_news_index(data_version, tuple(recommendations))
+    except requests.HTTPError as e:
+        st.error(f"Erro ao buscar dados das notícias: {e.response.status_code}")
+        return
+    display_news(news_index, recommendations)
+
+try:
+    if not st.session_state.logged_in:
+        recommendations = get_cold_start(data_version)
     else:
-        st.error(f"Erro ao buscar recomendações: {response.status_code}")
+        st.success(f"Bem-vindo {st.session_state.username}!")
+        recommendations = get_recommendations(data_version, st.session_state.user_id)
+except requests.HTTPError as e:
+    st.error(f"Erro ao buscar recomendações: {e.response.status_code}")
 else:
-    st.success(f"Bem-vindo {st.session_state.username}!")
-    response = requests.post(f"{API_URL}/predict/{st.session_state.user_id}")
-    if response.status_code == 200:
-        recommendations = response.json().get("recommendations", [])
-        news_data_response = requests.get(f"{API_URL}/get_news_data")
-        if news_data_response.status_code == 200:
-            display_news(news_data_response.json(), recommendations)
-        else:
-            st.error(f"Erro ao buscar dados das notícias: {news_data_response.status_code}")
-    else:
-        st.error(f"Erro ao buscar recomendações: {response.status_code}")
+    show_recommendations(recommendations)
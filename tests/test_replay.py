@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("mlflow")
+lightfm = pytest.importorskip("lightfm")
+from scipy.sparse import coo_matrix
+
+from app.model_utils import LightFMWrapper, predict_recommendations
+from app.replay import Replayer, compare
+
+
+class PyFuncModel:
+    """Mesma interface do mlflow.pyfunc.PyFuncModel devolvido por `load_model_version`."""
+
+    def __init__(self, python_model):
+        self._python_model = python_model
+
+    def unwrap_python_model(self):
+        return self._python_model
+
+    def predict(self, data, params=None):
+        raise TypeError("PyFuncModel.predict recebe (data, params), não (user_ids, item_ids).")
+
+
+def train(n_users, n_items, seed):
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, n_users, size=n_users * 5)
+    cols = rng.integers(0, n_items, size=n_users * 5)
+    interactions = coo_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n_users, n_items))
+    return lightfm.LightFM(no_components=4, random_state=seed).fit(interactions, epochs=2)
+
+
+def test_compare_scores_registry_models():
+    n_users, n_items = 20, 30
+    news_data = pd.DataFrame({"page": [f"p{i}" for i in range(n_items)], "count": np.arange(n_items)})
+    user_data = pd.DataFrame({
+        "userId": [f"u{i}" for i in range(n_users)],
+        "history": [[f"p{(i + j) % n_items}" for j in range(3)] for i in range(n_users)],
+    })
+    baseline, candidate = train(n_users, n_items, seed=1), train(n_users, n_items, seed=2)
+
+    started = time.time()
+    entries = []
+    for i in range(n_users):
+        captured = predict_recommendations.__wrapped__(baseline, i, [], news_data, top_n=5)
+        entries.append({"timestamp": started + i * 0.001, "user_id": f"u{i}", "k": 5, "n_candidates": 0,
+                        "response": {"recommendations": captured, "tier": "model"}})
+
+    models = {"1": PyFuncModel(LightFMWrapper(baseline)), "2": PyFuncModel(LightFMWrapper(candidate))}
+    report = compare(Replayer(user_data, news_data), models, entries, speedup=0, workers=2)
+
+    for version in models:
+        assert report["versions"][version]["errors"] == 0
+        assert report["versions"][version]["latency_ms"]
+    assert report["versions"]["1"]["overlap_with_capture"] == pytest.approx(1.0)
+    assert report["top_k_overlap"] is not None